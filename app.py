@@ -3,6 +3,7 @@ import streamlit as st
 import time
 import pandas as pd
 import json
+import contextlib
 from datetime import datetime, timedelta
 from streamlit.components.v1 import html
 
@@ -10,8 +11,10 @@ from streamlit.components.v1 import html
 from config.syllabus import GATE_CSE_SYLLABUS
 from core.orchestrator import generate_test_concurrently, generate_full_mock_test
 from core.llm_client import check_and_pull_model
+from components.scoring import option_label, answer_letters, correct_answers, is_answer_correct
 from components.analytics import initialize_db, save_test_result, get_test_history
 from components.vector_store import search_questions
+from components.coverage import get_topic_saturation, backfill_coverage
 
 # --- Page & State Management ---
 st.set_page_config(page_title="GATE AI Exam System", layout="wide")
@@ -55,24 +58,7 @@ def calculate_score():
     """Calculates the final score based on user answers."""
     score = 0
     for i, q in enumerate(st.session_state.questions):
-        user_ans = st.session_state.user_answers.get(i)
-        correct_ans_list = json.loads(q.get('answer', '[]')) if isinstance(q.get('answer'), str) else q.get('answer', [])
-        
-        is_correct = False
-        # Normalize user answer for comparison
-        user_ans_list = []
-        if user_ans is not None:
-            user_ans_list = user_ans if isinstance(user_ans, list) else [user_ans]
-
-        if q.get('type') in ['MCQ', 'MSQ']:
-            is_correct = sorted(user_ans_list) == sorted(correct_ans_list)
-        elif q.get('type') == 'NAT':
-            try:
-                is_correct = user_ans is not None and abs(float(user_ans) - float(correct_ans_list[0])) < 1e-4
-            except (ValueError, TypeError, IndexError):
-                is_correct = False
-        
-        if is_correct:
+        if is_answer_correct(q, st.session_state.user_answers.get(i)):
             score += 1 # You can add custom marks here (e.g., +2 for MSQ)
     return score
 
@@ -93,12 +79,27 @@ def show_results():
     save_test_result(st.session_state.test_topic, score, len(st.session_state.questions))
     st.session_state.exam_view = "results"
 
+def set_generation_notice(generated: int, requested: int):
+    """Tells the user when a batch came back short (failed pipelines or the deadline)."""
+    st.session_state.pop("generation_notice", None)
+    if generated == 0:
+        st.error("No questions could be generated. Please try again.")
+    elif generated < requested:
+        st.session_state.generation_notice = f"Generated {generated} of {requested} questions; the rest failed or ran out of time."
+
 def reset_to_main_menu():
     """Clears all test-related state."""
     st.session_state.clear()
     st.session_state.page = "generate"
     st.rerun()
 
+@st.cache_resource
+def initialize_process():
+    """One-time setup shared by every session in this server process."""
+    initialize_db()
+    backfill_coverage()
+    return True
+
 def initialize_session_state():
     """Runs the main initialization logic once per session."""
     if 'page' not in st.session_state:
@@ -106,7 +107,7 @@ def initialize_session_state():
     # FIX: Ensure one-time setup runs only once per session
     if 'app_initialized' not in st.session_state:
         with st.spinner("Initializing system..."):
-            initialize_db()
+            initialize_process()
             check_and_pull_model()
         st.session_state.app_initialized = True
 
@@ -132,10 +133,21 @@ with tab_new_test:
             with col1: subject = st.selectbox("Subject", options=GATE_CSE_SYLLABUS.keys(), key="p_subj")
             with col2: topic = st.selectbox("Topic", options=GATE_CSE_SYLLABUS[subject], key="p_top")
             with col3: num_q = st.number_input("Questions", min_value=1, max_value=20, value=5, key="p_num")
+            saturation = get_topic_saturation(topic)
+            st.caption(f"Question bank: {saturation['questions']} questions across {saturation['sub_concepts']} sub-concepts (saturation {saturation['saturation']:.0%})")
             if st.button("Generate Practice Test", type="primary", key="p_btn"):
                 st.session_state.test_topic = topic
                 with st.spinner(f"Generating {num_q} questions..."):
-                    qs = [q for q in generate_test_concurrently(topic, num_q) if q]
+                    # Updating the progress bar after each result gives Streamlit a point to stop
+                    # the script on a rerun or disconnect, which closes the generator and cancels the batch.
+                    progress = st.progress(0.0, text=f"Generated 0 of {num_q} questions")
+                    qs = []
+                    # closing() guarantees the batch's cleanup (cancel + executor shutdown) runs on a stop.
+                    with contextlib.closing(generate_test_concurrently(topic, num_q)) as results:
+                        for finished, q in enumerate(results, start=1):
+                            if q: qs.append(q)
+                            progress.progress(finished / num_q, text=f"Generated {len(qs)} of {num_q} questions")
+                set_generation_notice(len(qs), num_q)
                 if qs:
                     st.session_state.questions = qs
                     st.session_state.test_in_progress = True
@@ -148,7 +160,12 @@ with tab_new_test:
             if st.button("Generate Full Mock Test", type="primary", key="m_btn"):
                 st.session_state.test_topic = "Full Syllabus Mock Test"
                 with st.spinner(f"Generating a {num_q_mock}-question test..."):
-                    qs = generate_full_mock_test(num_q_mock)
+                    progress = st.progress(0.0, text=f"Generated 0 of {num_q_mock} questions")
+                    qs = generate_full_mock_test(
+                        num_q_mock,
+                        on_progress=lambda generated, finished, total: progress.progress(finished / total, text=f"Generated {generated} of {total} questions")
+                    )
+                set_generation_notice(len(qs), num_q_mock)
                 if qs:
                     st.session_state.questions = qs
                     st.session_state.test_in_progress = True
@@ -166,6 +183,8 @@ with tab_live_exam:
             num_qs = len(st.session_state.questions)
             duration = num_qs * 1.5
             st.info(f"Topic: {st.session_state.test_topic} | Questions: {num_qs} | Time: {int(duration)} mins")
+            if st.session_state.get("generation_notice"):
+                st.warning(st.session_state.generation_notice)
             agree = st.checkbox("I have read the instructions.")
             if st.button("Start Test", type="primary", disabled=not agree):
                 start_test(duration)
@@ -209,12 +228,12 @@ with tab_live_exam:
                     key_prefix = f"q_{st.session_state.current_question}"
                     options = q_data.get('options', [])
                     if q_data['type'] == 'MCQ':
-                        answer = st.radio("Options", options, key=f"{key_prefix}_mcq", label_visibility="collapsed")
+                        answer = st.radio("Options", options, key=f"{key_prefix}_mcq", label_visibility="collapsed", format_func=lambda opt: option_label(options, opt))
                     elif q_data['type'] == 'MSQ':
                         selected = []
                         st.write("Select all correct options:")
                         for opt in options:
-                            if st.checkbox(opt, key=f"{key_prefix}_{opt}"): selected.append(opt)
+                            if st.checkbox(option_label(options, opt), key=f"{key_prefix}_{opt}"): selected.append(opt)
                         answer = selected
                     elif q_data['type'] == 'NAT':
                         answer = st.number_input("Your Answer", key=f"{key_prefix}_nat", value=None, format="%.2f")
@@ -237,25 +256,19 @@ with tab_live_exam:
             for i, q in enumerate(st.session_state.questions):
                 with st.expander(f"Question {i+1}: Review"):
                     user_ans = st.session_state.user_answers.get(i)
-                    correct_ans_list = json.loads(q.get('answer', '[]')) if isinstance(q.get('answer'), str) else q.get('answer', [])
-                    is_correct = False
-                    user_ans_list = []
-                    if user_ans is not None:
-                        user_ans_list = user_ans if isinstance(user_ans, list) else [user_ans]
+                    correct_ans_list = correct_answers(q)
+                    is_correct = is_answer_correct(q, user_ans)
+                    user_ans_list = answer_letters(q, user_ans)
 
-                    if q.get('type') in ['MCQ', 'MSQ']:
-                        is_correct = sorted(user_ans_list) == sorted(correct_ans_list)
-                    elif q.get('type') == 'NAT':
-                        try:
-                            is_correct = user_ans is not None and abs(float(user_ans) - float(correct_ans_list[0])) < 1e-4
-                        except (ValueError, TypeError, IndexError):
-                            is_correct = False
-                    
                     st.markdown(f"**Q:** {q['question']}")
+                    options = q.get('options', [])
+                    for opt in options:
+                        st.markdown(f"- {option_label(options, opt)}")
+                    shown_ans = user_ans_list if q.get('type') in ['MCQ', 'MSQ'] else user_ans
                     if is_correct:
-                        st.success(f"**Your Answer:** `{user_ans}` (Correct)")
+                        st.success(f"**Your Answer:** `{shown_ans}` (Correct)")
                     else:
-                        st.error(f"**Your Answer:** `{user_ans if user_ans is not None else 'Not Answered'}` (Incorrect)")
+                        st.error(f"**Your Answer:** `{shown_ans if user_ans is not None else 'Not Answered'}` (Incorrect)")
                     
                     st.success(f"**Correct Answer:** `{correct_ans_list}`")
                     st.markdown(f"**Explanation:**\n{q['explanation']}")
@@ -32,6 +32,17 @@ def initialize_db():
             test_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         """)
+        # Table mapping each topic's sub-concepts to the questions generated for them
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sub_concept_coverage (
+            topic TEXT NOT NULL,
+            sub_concept TEXT NOT NULL,
+            question_ids TEXT NOT NULL, -- JSON list of question_bank ids
+            centroid TEXT NOT NULL, -- JSON list, mean embedding of the questions
+            name_embedding TEXT NOT NULL, -- JSON list, embedding of the sub-concept name
+            PRIMARY KEY (topic, sub_concept)
+        )
+        """)
         conn.commit()
 
 def save_test_result(topic, score, total_questions):
@@ -0,0 +1,175 @@
+# components/coverage.py
+import json
+import random
+import sqlite3
+import threading
+import numpy as np
+from .analytics import DB_FILE
+from .vector_store import embedding_model, question_collection
+
+# Sub-concept names from the topic analysis agent are reworded on every call, so a
+# candidate counts against an indexed sub-concept when their names are this similar.
+SUB_CONCEPT_MATCH_THRESHOLD = 0.8
+# A sub-concept with this many questions counts as half saturated.
+SATURATION_HALF_POINT = 3
+
+# Serializes read-modify-write updates from concurrent pipelines.
+_coverage_lock = threading.Lock()
+_dedup_lock = threading.Lock()
+_dedup_stats: dict[str, dict[str, int]] = {}
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    denom = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(np.dot(a, b) / denom) if denom else 0.0
+
+def _load_topic_coverage(topic: str) -> list[dict]:
+    """Loads every indexed sub-concept for a topic."""
+    with sqlite3.connect(DB_FILE) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            "SELECT sub_concept, question_ids, centroid, name_embedding FROM sub_concept_coverage WHERE topic = ?",
+            (topic,)
+        ).fetchall()
+    return [
+        {
+            "sub_concept": row["sub_concept"],
+            "question_ids": json.loads(row["question_ids"]),
+            "centroid": np.array(json.loads(row["centroid"])),
+            "name_embedding": np.array(json.loads(row["name_embedding"])),
+        }
+        for row in rows
+    ]
+
+def _matches(name: str, name_embedding: np.ndarray, entry: dict) -> bool:
+    return entry["sub_concept"] == name or _cosine(name_embedding, entry["name_embedding"]) >= SUB_CONCEPT_MATCH_THRESHOLD
+
+def _attach_questions(topic: str, sub_concept: str, name_embedding: np.ndarray, question_ids: list[int], embeddings: list) -> int:
+    """
+    Adds questions to the indexed sub-concept whose name matches `sub_concept`,
+    or creates a new entry if none is close enough. Questions that are already
+    indexed are skipped, so a backfill racing with a pipeline can't count one twice.
+    Returns how many questions were added. Caller holds _coverage_lock.
+    """
+    coverage = _load_topic_coverage(topic)
+    indexed = {question_id for entry in coverage for question_id in entry["question_ids"]}
+    new = [(qid, emb) for qid, emb in zip(question_ids, embeddings) if qid not in indexed]
+    if not new:
+        return 0
+    question_ids = [qid for qid, _ in new]
+    embeddings = [emb for _, emb in new]
+    # Prefer an exact name match, then the most similar name above the threshold.
+    match = max(
+        (entry for entry in coverage if _matches(sub_concept, name_embedding, entry)),
+        key=lambda entry: (entry["sub_concept"] == sub_concept, _cosine(name_embedding, entry["name_embedding"])),
+        default=None
+    )
+
+    with sqlite3.connect(DB_FILE) as conn:
+        if match:
+            count = len(match["question_ids"])
+            # Running mean, so the centroid never needs the old embeddings.
+            centroid = (match["centroid"] * count + np.sum(embeddings, axis=0)) / (count + len(embeddings))
+            conn.execute(
+                "UPDATE sub_concept_coverage SET question_ids = ?, centroid = ? WHERE topic = ? AND sub_concept = ?",
+                (json.dumps(match["question_ids"] + question_ids), json.dumps(centroid.tolist()), topic, match["sub_concept"])
+            )
+        else:
+            conn.execute(
+                "INSERT INTO sub_concept_coverage (topic, sub_concept, question_ids, centroid, name_embedding) VALUES (?, ?, ?, ?, ?)",
+                (topic, sub_concept, json.dumps(question_ids), json.dumps(np.mean(embeddings, axis=0).tolist()), json.dumps(name_embedding.tolist()))
+            )
+        conn.commit()
+    return len(question_ids)
+
+def record_question_coverage(topic: str, sub_concept: str, question_id: int, embedding: list[float]):
+    """
+    Adds a saved question to the index and updates its sub-concept's centroid.
+    Reworded names of an already indexed sub-concept are merged into its entry.
+    """
+    name_embedding = embedding_model.encode(sub_concept)
+    with _coverage_lock:
+        _attach_questions(topic, sub_concept, name_embedding, [question_id], [embedding])
+
+def backfill_coverage():
+    """
+    Indexes question_bank rows that predate the coverage index. It scans the whole
+    bank, so call it once per process rather than once per session.
+    Their sub-concepts were never recorded, so each topic's unindexed questions
+    go into one entry named after the topic, using their embeddings from Chroma.
+    """
+    with _coverage_lock:
+        with sqlite3.connect(DB_FILE) as conn:
+            bank = conn.execute("SELECT id, topic FROM question_bank").fetchall()
+            indexed = {
+                question_id
+                for (question_ids,) in conn.execute("SELECT question_ids FROM sub_concept_coverage")
+                for question_id in json.loads(question_ids)
+            }
+
+        missing: dict[str, list[int]] = {}
+        for question_id, topic in bank:
+            if question_id not in indexed:
+                missing.setdefault(topic, []).append(question_id)
+
+        backfilled = 0
+        for topic, question_ids in missing.items():
+            result = question_collection.get(ids=[str(i) for i in question_ids], include=["embeddings"])
+            found = list(zip(result["ids"], result["embeddings"]))
+            if not found:
+                continue
+            backfilled += _attach_questions(
+                topic, topic, embedding_model.encode(topic),
+                [int(question_id) for question_id, _ in found],
+                [np.array(embedding) for _, embedding in found]
+            )
+    if backfilled:
+        print(f"📚 Backfilled {backfilled} existing questions into the coverage index.")
+
+def choose_sub_concept(topic: str, sub_concepts: list[str]) -> str:
+    """
+    Picks a sub-concept, weighted towards those with the fewest existing questions.
+    A candidate's count is the number of indexed questions under any sub-concept
+    with the same or a near-identical name.
+    """
+    coverage = _load_topic_coverage(topic)
+    if not coverage:
+        return random.choice(sub_concepts)
+
+    candidate_embeddings = embedding_model.encode(sub_concepts)
+    weights = []
+    for name, candidate in zip(sub_concepts, candidate_embeddings):
+        covered = sum(len(entry["question_ids"]) for entry in coverage if _matches(name, candidate, entry))
+        weights.append(1 / (1 + covered))
+    return random.choices(sub_concepts, weights=weights, k=1)[0]
+
+def record_dedup_outcome(topic: str, rejected: bool):
+    """Counts whether a finished question was rejected as a near-duplicate."""
+    with _dedup_lock:
+        stats = _dedup_stats.setdefault(topic, {"accepted": 0, "rejected": 0})
+        stats["rejected" if rejected else "accepted"] += 1
+
+def get_topic_saturation(topic: str) -> dict:
+    """
+    Summarizes how crowded a topic is.
+    `saturation` is the mean of n / (n + SATURATION_HALF_POINT) over its indexed
+    sub-concepts (0 = empty, towards 1 = every sub-concept heavily covered);
+    `centroid_similarity` is the mean pairwise cosine similarity of the
+    sub-concept centroids, which rises as the questions cluster together.
+    """
+    coverage = _load_topic_coverage(topic)
+    counts = [len(entry["question_ids"]) for entry in coverage]
+    centroids = [entry["centroid"] for entry in coverage]
+    pairs = [_cosine(a, b) for i, a in enumerate(centroids) for b in centroids[i + 1:]]
+
+    with _dedup_lock:
+        dedup = dict(_dedup_stats.get(topic, {"accepted": 0, "rejected": 0}))
+    attempts = dedup["accepted"] + dedup["rejected"]
+
+    return {
+        "topic": topic,
+        "questions": sum(counts),
+        "sub_concepts": len(coverage),
+        "saturation": sum(n / (n + SATURATION_HALF_POINT) for n in counts) / len(counts) if counts else 0.0,
+        "centroid_similarity": sum(pairs) / len(pairs) if pairs else 0.0,
+        "dedup_rejection_rate": dedup["rejected"] / attempts if attempts else 0.0,
+    }
@@ -0,0 +1,31 @@
+# components/scoring.py
+import json
+from core.schemas import OPTION_LETTERS
+
+def option_label(options, opt):
+    """Prefixes an option with its A-D letter, the form answers are stored in."""
+    return f"{OPTION_LETTERS[options.index(opt)]}) {opt}" if opt in options else opt
+
+def answer_letters(q, user_ans):
+    """Maps the option text(s) a student picked to their A-D letters."""
+    if user_ans is None:
+        return []
+    options = q.get('options', [])
+    picked = user_ans if isinstance(user_ans, list) else [user_ans]
+    return [OPTION_LETTERS[options.index(p)] if p in options else p for p in picked]
+
+def correct_answers(q):
+    """Returns a question's answer list, whether it is stored as JSON text or a list."""
+    return json.loads(q.get('answer', '[]')) if isinstance(q.get('answer'), str) else q.get('answer', [])
+
+def is_answer_correct(q, user_ans):
+    """Checks a student's answer (option text for MCQ/MSQ, a number for NAT) against the key."""
+    correct_ans_list = correct_answers(q)
+    if q.get('type') in ['MCQ', 'MSQ']:
+        return sorted(answer_letters(q, user_ans)) == sorted(correct_ans_list)
+    if q.get('type') == 'NAT':
+        try:
+            return user_ans is not None and abs(float(user_ans) - float(correct_ans_list[0])) < 1e-4
+        except (ValueError, TypeError, IndexError):
+            return False
+    return False
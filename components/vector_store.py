@@ -12,14 +12,15 @@ embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 # Get or create a collection for our questions
 question_collection = client.get_or_create_collection(name="gate_questions")
 
-def add_question_to_rag(question_id: int, question_text: str):
-    """Adds a new question's embedding to the vector store."""
+def add_question_to_rag(question_id: int, question_text: str) -> list[float]:
+    """Adds a new question's embedding to the vector store and returns the embedding."""
     embedding = embedding_model.encode(question_text).tolist()
     question_collection.add(
         embeddings=[embedding],
         documents=[question_text],
         ids=[str(question_id)]
     )
+    return embedding
 
 def find_similar_question(question_text: str, threshold=0.98) -> bool:
     """Checks if a highly similar question already exists in the RAG store."""
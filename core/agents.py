@@ -1,9 +1,23 @@
 # core/agents.py
 from ddgs import DDGS # Updated import
 from .llm_client import generate_json_response
+from .cancellation import CancellationToken, PipelineCancelled
+from .schemas import (
+    TOPIC_ANALYSIS_SCHEMA,
+    QUESTION_SCHEMA,
+    REFINED_QUESTION_SCHEMA,
+    CRITIQUE_SCHEMA,
+    normalize_sub_concepts,
+    normalize_question,
+    normalize_critique,
+    validate_response
+)
 import json
 
-def topic_analysis_agent(topic: str) -> list:
+# Upper bound on a single web search; callers' deadlines can shorten it further.
+RESEARCH_TIMEOUT_S = 10
+
+def topic_analysis_agent(topic: str, token: CancellationToken | None = None) -> list:
     """Academic Decomposer: Breaks a topic into specific, researchable sub-concepts."""
     system_prompt = """
     You are an expert GATE CSE Academic Decomposer. Your task is to break down a high-level syllabus topic
@@ -13,45 +27,53 @@ def topic_analysis_agent(topic: str) -> list:
     Output ONLY a JSON object with a single key "sub_concepts" which is a list of strings.
     """
     user_prompt = f"Decompose this GATE CSE topic: '{topic}'"
-    response = generate_json_response(system_prompt, user_prompt)
-    return response.get("sub_concepts", []) if response else []
+    response = generate_json_response(system_prompt, user_prompt, schema=TOPIC_ANALYSIS_SCHEMA, label="topic_analysis_agent", token=token)
+    response = validate_response("topic_analysis_agent", response, normalize_sub_concepts)
+    return response["sub_concepts"] if response else []
 
-def research_agent(sub_concept: str) -> str:
+def research_agent(sub_concept: str, token: CancellationToken | None = None) -> str:
     """Diligent Research Assistant: Gathers rich context for a sub-concept from the web."""
     print(f"🔬 Researching: {sub_concept}")
+    if token:
+        token.raise_if_cancelled("research_agent")
+    timeout = token.timeout_for(RESEARCH_TIMEOUT_S) if token else RESEARCH_TIMEOUT_S
     try:
-        with DDGS() as ddgs:
+        with DDGS(timeout=timeout) as ddgs:
             results = [r['body'] for r in ddgs.text(f"in-depth academic explanation of {sub_concept} for computer science students", max_results=4)]
             context = "\n\n---\n\n".join(results)
             return context if context else f"No search results found for {sub_concept}."
     except Exception as e:
+        if token and token.is_cancelled():
+            raise PipelineCancelled("research_agent")
         print(f"Error during web search for '{sub_concept}': {e}")
         return f"An error occurred during web search for {sub_concept}."
 
-def question_drafting_agent(context: str, topic: str) -> dict | None:
+def question_drafting_agent(context: str, topic: str, token: CancellationToken | None = None) -> dict | None:
     """Creative Junior Professor: Drafts a GATE-level question from the provided context."""
-    system_prompt = f"""
+    system_prompt = """
     You are a Creative Junior Professor specializing in GATE CSE question creation. Your task is to draft a single,
-    complex, GATE-style question (MCQ, MSQ, or NAT) strictly based on the provided research context. The question must
-    be original and not a direct copy. It should require understanding and application of concepts, not simple recall.
-
-    Topic: {topic}
+    complex, GATE-style question (MCQ, MSQ, or NAT) on the given topic, strictly based on the provided research context.
+    The question must be original and not a direct copy. It should require understanding and application of concepts,
+    not simple recall.
 
     Output a single JSON object with this exact structure:
-    {{
+    {
       "question": "The full question text.",
       "type": "MCQ or MSQ or NAT",
       "options": ["Option A", "Option B", "Option C", "Option D"],
       "answer": ["B"],
       "explanation": "A detailed, step-by-step explanation."
-    }}
+    }
     - For NAT questions, "options" must be an empty list and "answer" a list with one numeric string (e.g., ["5.75"]).
+    - For MCQ and MSQ questions, "options" must have exactly 4 entries and "answer" must use the letters A-D.
     - For MSQ questions, "answer" can have multiple values (e.g., ["A", "C"]).
     """
-    user_prompt = f"Draft a question based on this context:\n\n{context}"
-    return generate_json_response(system_prompt, user_prompt)
+    # The topic goes in the user prompt so the system prompt stays a cacheable prefix.
+    user_prompt = f"Topic: {topic}\n\nDraft a question based on this context:\n\n{context}"
+    response = generate_json_response(system_prompt, user_prompt, schema=QUESTION_SCHEMA, label="question_drafting_agent", token=token)
+    return validate_response("question_drafting_agent", response, normalize_question)
 
-def critique_agent(draft_question: dict, context: str) -> dict | None:
+def critique_agent(draft_question: dict, context: str, token: CancellationToken | None = None) -> dict | None:
     """Ruthless Senior Moderator: Critiques the draft question for flaws."""
     system_prompt = """
     You are a Ruthless Senior Moderator for the GATE CSE exam committee. Your task is to critically evaluate a draft question.
@@ -67,9 +89,10 @@ def critique_agent(draft_question: dict, context: str) -> dict | None:
     "critique": "A concise, actionable list of required improvements. If none are needed, say 'The question is exam-ready.'"
     """
     user_prompt = f"Context:\n---\n{context}\n---\nDraft Question JSON:\n---\n{json.dumps(draft_question, indent=2)}\n---"
-    return generate_json_response(system_prompt, user_prompt)
+    response = generate_json_response(system_prompt, user_prompt, schema=CRITIQUE_SCHEMA, label="critique_agent", token=token)
+    return validate_response("critique_agent", response, normalize_critique)
 
-def refinement_agent(draft_question: dict, critique: dict, context: str) -> dict | None:
+def refinement_agent(draft_question: dict, critique: dict, context: str, token: CancellationToken | None = None) -> dict | None:
     """Senior Professor & Editor: Rewrites the question to address the critique."""
     system_prompt = """
     You are a Senior Professor and Editor-in-Chief of the GATE CSE exam committee. Your task is to revise and finalize
@@ -77,15 +100,18 @@ def refinement_agent(draft_question: dict, critique: dict, context: str) -> dict
     unambiguous, and factually correct exam-ready question.
 
     The final JSON output must have this exact structure:
-    {{
+    {
       "question": "string",
-      "type": "MCQ/MSQ/NAT/FIGURE",
-      "options": ["A", "B", "C", "D"],
+      "type": "MCQ or MSQ or NAT",
+      "options": ["Option A", "Option B", "Option C", "Option D"],
       "answer": ["B"],
       "explanation": "string",
       "difficulty": "GATE-level",
       "topic": "string"
-    }}
+    }
+    - For NAT questions, "options" must be an empty list and "answer" a list with one numeric string.
+    - For MCQ and MSQ questions, "options" must have exactly 4 entries and "answer" must use the letters A-D.
     """
     user_prompt = f"Original Context:\n---\n{context}\n---\nDraft Question:\n---\n{json.dumps(draft_question, indent=2)}\n---\nCritique:\n---\n{json.dumps(critique, indent=2)}\n---\nPlease provide the final, refined question JSON."
-    return generate_json_response(system_prompt, user_prompt)
\ No newline at end of file
+    response = generate_json_response(system_prompt, user_prompt, schema=REFINED_QUESTION_SCHEMA, label="refinement_agent", token=token)
+    return validate_response("refinement_agent", response, normalize_question)
\ No newline at end of file
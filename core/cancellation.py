@@ -0,0 +1,64 @@
+# core/cancellation.py
+import threading
+import time
+
+class PipelineCancelled(Exception):
+    """Raised inside a pipeline when its token is cancelled or its deadline passes."""
+    def __init__(self, stage: str):
+        super().__init__(f"Pipeline cancelled during {stage}")
+        self.stage = stage
+
+class CancellationToken:
+    """
+    A cooperative cancellation signal with an optional deadline.
+    Child tokens are cancelled whenever their parent is, so cancelling a batch
+    token stops every question pipeline started from it.
+    """
+    def __init__(self, deadline_s: float | None = None, parent: "CancellationToken | None" = None):
+        self._event = threading.Event()
+        self._deadline = time.monotonic() + deadline_s if deadline_s is not None else None
+        self._parent = parent
+
+    def child(self, deadline_s: float | None = None) -> "CancellationToken":
+        return CancellationToken(deadline_s, parent=self)
+
+    def cancel(self):
+        self._event.set()
+
+    def is_cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            return True
+        return self._parent.is_cancelled() if self._parent else False
+
+    def remaining(self) -> float | None:
+        """Seconds until the nearest deadline in the chain, or None if there is none."""
+        own = max(0.0, self._deadline - time.monotonic()) if self._deadline is not None else None
+        inherited = self._parent.remaining() if self._parent else None
+        if own is None or inherited is None:
+            return own if inherited is None else inherited
+        return min(own, inherited)
+
+    def timeout_for(self, default_s: float) -> float:
+        """Clamps a per-call timeout so it never outlives the token's deadline."""
+        remaining = self.remaining()
+        return default_s if remaining is None else min(default_s, remaining)
+
+    def raise_if_cancelled(self, stage: str):
+        if self.is_cancelled():
+            raise PipelineCancelled(stage)
+
+
+# --- Cancellation Statistics ---
+_stats_lock = threading.Lock()
+_cancelled_stages: dict[str, int] = {}
+
+def record_cancellation(stage: str):
+    with _stats_lock:
+        _cancelled_stages[stage] = _cancelled_stages.get(stage, 0) + 1
+
+def get_cancellation_stats() -> dict[str, int]:
+    """Returns how many pipelines were abandoned at each stage."""
+    with _stats_lock:
+        return dict(_cancelled_stages)
@@ -1,11 +1,44 @@
 # core/llm_client.py
 import ollama
+import httpx
 import json
+import threading
+from collections import deque
 import streamlit as st
+from .cancellation import CancellationToken, PipelineCancelled
 
 # --- Configuration ---
 # This is the model the application intends to use.
 MODEL = 'deepseek-llm:7b-chat'
+# How long Ollama keeps the model resident after the last request.
+KEEP_ALIVE = '30m'
+# Options sent with every request. Ollama reloads the runner whenever these
+# change between calls, so they must stay identical for warm-up and generation.
+# num_ctx matches the model's trained context window; a larger value would exceed
+# it and grow the per-slot KV cache, leaving room for fewer parallel requests.
+MODEL_OPTIONS = {
+    'num_ctx': 4096,
+}
+
+# Upper bound on a single chat request; callers' deadlines can shorten it further.
+LLM_REQUEST_TIMEOUT_S = 180
+
+# One connection pool shared by the default client and the short-lived clients
+# created for calls whose deadline is closer than LLM_REQUEST_TIMEOUT_S.
+_transport = httpx.HTTPTransport()
+_client = ollama.Client(timeout=LLM_REQUEST_TIMEOUT_S, transport=_transport)
+
+def _client_for(token: CancellationToken | None) -> ollama.Client:
+    """Returns a client whose timeout never outlives the token's deadline."""
+    timeout = token.timeout_for(LLM_REQUEST_TIMEOUT_S) if token else LLM_REQUEST_TIMEOUT_S
+    if timeout >= LLM_REQUEST_TIMEOUT_S:
+        return _client
+    # The transport (and its pooled connections) belongs to _client, so this one needs no closing.
+    return ollama.Client(timeout=timeout, transport=_transport)
+
+_timings_lock = threading.Lock()
+# Bounded so a long-running server doesn't accumulate timings forever.
+_call_timings: deque[dict] = deque(maxlen=1000)
 
 def check_and_pull_model():
     """
@@ -33,23 +66,99 @@ def check_and_pull_model():
         st.error(f"Error communicating with Ollama. Details: {e}")
         st.stop()
 
-def generate_json_response(system_prompt: str, user_prompt: str) -> dict | None:
-    """Sends prompts to the Ollama model and expects a JSON response."""
+    warm_up_model()
+
+def warm_up_model(token: CancellationToken | None = None) -> bool:
+    """
+    Loads the model into memory ahead of the first real request.
+    An empty prompt makes Ollama load the model and reset its keep-alive timer
+    without generating any tokens, so this is cheap when it is already resident.
+    The wait is bounded by the token's deadline and skipped if it is already cancelled.
+    """
+    if token and token.is_cancelled():
+        return False
+    try:
+        response = _client_for(token).generate(model=MODEL, prompt='', keep_alive=KEEP_ALIVE, options=MODEL_OPTIONS)
+        _record_timings('warm_up', response)
+        return True
+    except Exception as e:
+        print(f"Model warm-up failed: {e}")
+        return False
+
+def _record_timings(label: str, response):
+    """Stores and prints the load and prompt-eval durations Ollama reports (in ns)."""
+    timings = {
+        'label': label,
+        'load_s': (response.get('load_duration') or 0) / 1e9,
+        'prompt_eval_count': response.get('prompt_eval_count') or 0,
+        'prompt_eval_s': (response.get('prompt_eval_duration') or 0) / 1e9,
+        'eval_count': response.get('eval_count') or 0,
+        'eval_s': (response.get('eval_duration') or 0) / 1e9,
+    }
+    with _timings_lock:
+        _call_timings.append(timings)
+    print(
+        f"⏱️ {label}: load {timings['load_s']:.2f}s | "
+        f"prompt eval {timings['prompt_eval_count']} tokens in {timings['prompt_eval_s']:.2f}s | "
+        f"generation {timings['eval_count']} tokens in {timings['eval_s']:.2f}s"
+    )
+
+def get_call_timings() -> list[dict]:
+    """Returns the recorded per-call Ollama timings."""
+    with _timings_lock:
+        return list(_call_timings)
+
+def generate_json_response(system_prompt: str, user_prompt: str, schema: dict | None = None, label: str = 'chat', token: CancellationToken | None = None) -> dict | None:
+    """
+    Sends prompts to the Ollama model and expects a JSON response.
+    If a JSON Schema is given, it is passed as the structured-output format so
+    the model's decoding is constrained to that shape. The system prompt comes
+    first and should be static, so Ollama can reuse its cached prefix.
+    The response is streamed so a cancelled token can abandon the request
+    between chunks; closing the stream makes Ollama stop generating.
+    """
+    if token:
+        token.raise_if_cancelled(label)
+    client = _client_for(token)
+
+    response_content = None
+    stream = None
     try:
-        response = ollama.chat(
+        stream = client.chat(
             model=MODEL,
-            format='json',
+            format=schema if schema else 'json',
             messages=[
                 {'role': 'system', 'content': system_prompt},
                 {'role': 'user', 'content': user_prompt},
-            ]
+            ],
+            keep_alive=KEEP_ALIVE,
+            options=MODEL_OPTIONS,
+            stream=True
         )
-        response_content = response['message']['content']
+        chunks = []
+        final_chunk = None
+        for chunk in stream:
+            if token:
+                token.raise_if_cancelled(label)
+            chunks.append(chunk['message']['content'])
+            final_chunk = chunk
+        # Only the final chunk carries Ollama's timing fields.
+        if final_chunk is not None:
+            _record_timings(label, final_chunk)
+        response_content = ''.join(chunks)
         return json.loads(response_content)
+    except PipelineCancelled:
+        raise
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON from LLM: {e}")
         print(f"Raw LLM response: {response_content}")
         return None
     except Exception as e:
+        # A timeout caused by the token's deadline is a cancellation, not a model failure.
+        if token and token.is_cancelled():
+            raise PipelineCancelled(label)
         print(f"An unexpected error occurred with Ollama: {e}")
-        return None
\ No newline at end of file
+        return None
+    finally:
+        if stream is not None:
+            stream.close()
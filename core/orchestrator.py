@@ -1,5 +1,8 @@
 # core/orchestrator.py
 import concurrent.futures
+import contextlib
+import math
+import os
 import random
 import json
 import sqlite3
@@ -10,10 +13,33 @@ from .agents import (
     critique_agent,
     refinement_agent
 )
+from .llm_client import warm_up_model
+from .schemas import log_validation_stats
+from .cancellation import CancellationToken, PipelineCancelled, record_cancellation
 from components.vector_store import find_similar_question, add_question_to_rag
+from components.coverage import choose_sub_concept, record_question_coverage, record_dedup_outcome
 from components.analytics import DB_FILE
 from config.syllabus import GATE_CSE_SYLLABUS
 
+# --- Concurrency & Deadlines ---
+# One local Ollama instance serves OLLAMA_NUM_PARALLEL requests at a time; more
+# concurrent pipelines would only queue inside Ollama while their deadlines run.
+MAX_CONCURRENT_PIPELINES = int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+# Time budget for one pipeline attempt (four LLM calls and a web search).
+ATTEMPT_DEADLINE_S = 100
+MAX_RETRIES = 3
+
+def question_deadline_s(max_retries: int = MAX_RETRIES) -> float:
+    """Deadline for one question pipeline, counted from when it starts running."""
+    return max_retries * ATTEMPT_DEADLINE_S
+
+def batch_deadline_s(num_tasks: int, max_retries: int = MAX_RETRIES) -> float:
+    """
+    Deadline for a whole batch: every wave of concurrent pipelines using its full
+    question deadline. It only cuts off work that is stuck, not a slow but healthy batch.
+    """
+    return math.ceil(num_tasks / MAX_CONCURRENT_PIPELINES) * question_deadline_s(max_retries)
+
 # --- NEW: Blueprint for Full Mock Test ---
 # Defines the approximate percentage of questions from each subject.
 MOCK_TEST_BLUEPRINT = {
@@ -50,34 +76,43 @@ def save_question_to_db(q_data: dict) -> int:
         conn.commit()
         return cursor.lastrowid
 
-def generate_question_pipeline(topic: str, max_retries=3):
-    # This function is unchanged
+def generate_question_pipeline(topic: str, max_retries=MAX_RETRIES, token: CancellationToken | None = None):
+    """Runs the agent pipeline for one question, returning None if it fails or is cancelled."""
+    try:
+        return _run_question_pipeline(topic, max_retries, token)
+    except PipelineCancelled as e:
+        record_cancellation(e.stage)
+        print(f"⏹️ Pipeline for '{topic}' cancelled during {e.stage}.")
+        return None
+
+def _run_question_pipeline(topic: str, max_retries: int, token: CancellationToken | None):
     for attempt in range(max_retries):
         print(f"\n🚀 Starting pipeline for topic: {topic} (Attempt {attempt + 1})")
 
-        sub_concepts = topic_analysis_agent(topic)
+        sub_concepts = topic_analysis_agent(topic, token=token)
         if not sub_concepts:
             print(f"  - Agent failed: TopicAnalysisAgent on '{topic}'.")
             continue
-        selected_concept = random.choice(sub_concepts)
+        # Steer towards sub-concepts the bank hasn't covered yet, so fewer drafts are rejected as duplicates.
+        selected_concept = choose_sub_concept(topic, sub_concepts)
 
-        context = research_agent(selected_concept)
+        context = research_agent(selected_concept, token=token)
         if "error" in context or "No search results" in context:
             print(f"  - Agent failed: ResearchAgent on '{selected_concept}'.")
             continue
 
-        draft_question = question_drafting_agent(context, topic)
+        draft_question = question_drafting_agent(context, topic, token=token)
         if not draft_question:
             print("  - Agent failed: QuestionDraftingAgent returned nothing.")
             continue
 
-        critique = critique_agent(draft_question, context)
+        critique = critique_agent(draft_question, context, token=token)
         if not critique:
             print("  - Agent failed: CritiqueAgent returned nothing.")
             continue
 
         if not critique.get("is_exam_ready", False):
-            final_question = refinement_agent(draft_question, critique, context)
+            final_question = refinement_agent(draft_question, critique, context, token=token)
         else:
             final_question = draft_question
             final_question['difficulty'] = 'GATE-level'
@@ -88,31 +123,67 @@ def generate_question_pipeline(topic: str, max_retries=3):
         
         final_question['topic'] = topic
 
-        if not find_similar_question(final_question['question']):
-            question_id = save_question_to_db(final_question)
-            if question_id:
-                add_question_to_rag(question_id, final_question['question'])
-                print(f"✅ Unique question generated and saved with ID: {question_id}")
-                return final_question
-        
+        if find_similar_question(final_question['question']):
+            record_dedup_outcome(topic, rejected=True)
+            continue
+
+        question_id = save_question_to_db(final_question)
+        if question_id:
+            embedding = add_question_to_rag(question_id, final_question['question'])
+            record_question_coverage(topic, selected_concept, question_id, embedding)
+            record_dedup_outcome(topic, rejected=False)
+            print(f"✅ Unique question generated and saved with ID: {question_id}")
+            return final_question
+        print("  - Failed to save the question to the database.")
+
     print(f"🛑 Pipeline failed to generate a unique question for '{topic}' after {max_retries} retries.")
     return None
 
-def generate_test_concurrently(topic: str, num_questions: int):
-    # This function is unchanged
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_questions) as executor:
-        futures = [executor.submit(generate_question_pipeline, topic) for _ in range(num_questions)]
-        for future in concurrent.futures.as_completed(futures):
+def _start_pipeline(topic: str, batch_token: CancellationToken):
+    # The question deadline starts when a worker picks the task up, not when it is queued.
+    return generate_question_pipeline(topic, token=batch_token.child(question_deadline_s()))
+
+def _run_batch(tasks: list[str], token: CancellationToken | None, deadline_s: float | None, label: str):
+    """
+    Runs one pipeline per task and yields each result (None for a failed pipeline)
+    as it finishes. Cancelling `token`, hitting the batch deadline, or closing the
+    generator early cancels the pipelines still running or queued.
+    """
+    if not tasks:
+        return
+    batch_token = CancellationToken(deadline_s or batch_deadline_s(len(tasks)), parent=token)
+    # Make sure the model is resident before fanning out, so the workers don't all wait on a cold load.
+    warm_up_model(batch_token)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(len(tasks), MAX_CONCURRENT_PIPELINES))
+    try:
+        futures = [executor.submit(_start_pipeline, task, batch_token) for task in tasks]
+        for future in concurrent.futures.as_completed(futures, timeout=batch_token.remaining()):
             try:
-                result = future.result()
-                if result: yield result
+                yield future.result()
             except Exception as e:
-                print(f"Pipeline execution generated an exception: {e}")
+                print(f"{label} pipeline execution generated an exception: {e}")
                 yield None
+    except concurrent.futures.TimeoutError:
+        print(f"⏹️ {label} hit its deadline; cancelling unfinished pipelines.")
+    finally:
+        batch_token.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        log_validation_stats()
+
+def generate_test_concurrently(topic: str, num_questions: int, token: CancellationToken | None = None, deadline_s: float | None = None):
+    """
+    Yields one result per pipeline as it finishes: a question, or None if that
+    pipeline failed. Consumers get a chance to stop (and cancel the rest) after each one.
+    """
+    yield from _run_batch([topic] * num_questions, token, deadline_s, f"Batch for '{topic}'")
 
 # --- NEW: Orchestrator for Full Mock Test ---
-def generate_full_mock_test(total_questions: int):
-    """Generates a full mock test based on the blueprint."""
+def generate_full_mock_test(total_questions: int, token: CancellationToken | None = None, deadline_s: float | None = None, on_progress=None):
+    """
+    Generates a full mock test based on the blueprint, stopping at the batch deadline
+    or when `token` is cancelled. `on_progress(generated, finished, total)` is called
+    after each pipeline finishes; an exception raised from it cancels the rest.
+    """
     tasks = []
     # Calculate the number of questions for each subject based on the blueprint
     for subject, percentage in MOCK_TEST_BLUEPRINT.items():
@@ -126,14 +197,11 @@ def generate_full_mock_test(total_questions: int):
 
     # Concurrently generate all questions from the task list
     questions = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(tasks)) as executor:
-        futures = [executor.submit(generate_question_pipeline, task) for task in tasks]
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                result = future.result()
-                if result: questions.append(result)
-            except Exception as e:
-                print(f"A full mock test pipeline execution generated an exception: {e}")
+    # closing() shuts the batch down at once if on_progress raises (e.g. Streamlit stopping the script).
+    with contextlib.closing(_run_batch(tasks, token, deadline_s, "Full mock test")) as results:
+        for finished, result in enumerate(results, start=1):
+            if result: questions.append(result)
+            if on_progress: on_progress(len(questions), finished, len(tasks))
 
     random.shuffle(questions)
     return questions
\ No newline at end of file
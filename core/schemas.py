@@ -0,0 +1,212 @@
+# core/schemas.py
+import math
+import re
+import threading
+
+# --- Structured-Output Schemas ---
+# Passed to Ollama as the `format` argument so decoding is constrained to the
+# expected shape instead of relying on a prose description in the prompt.
+TOPIC_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sub_concepts": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+    },
+    "required": ["sub_concepts"],
+}
+
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "type": {"type": "string", "enum": ["MCQ", "MSQ", "NAT"]},
+        "options": {"type": "array", "items": {"type": "string"}, "maxItems": 4},
+        "answer": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+        "explanation": {"type": "string"},
+    },
+    "required": ["question", "type", "options", "answer", "explanation"],
+}
+
+REFINED_QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **QUESTION_SCHEMA["properties"],
+        "difficulty": {"type": "string"},
+        "topic": {"type": "string"},
+    },
+    "required": QUESTION_SCHEMA["required"],
+}
+
+CRITIQUE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_exam_ready": {"type": "boolean"},
+        "critique": {"type": "string"},
+    },
+    "required": ["is_exam_ready", "critique"],
+}
+
+OPTION_LETTERS = ["A", "B", "C", "D"]
+QUESTION_TYPES = {"MCQ", "MSQ", "NAT"}
+
+# Matches "A", "(A)", "A)", "A.", "Option A" and similar letter-only answers.
+_LETTER_RE = re.compile(r"^\(?(?:option\s+)?([A-D])[\).:]?$", re.IGNORECASE)
+# Matches a leading "A) " / "(A) " / "A. " label the model sometimes adds to option text.
+_OPTION_LABEL_RE = re.compile(r"^\(?[A-D][\).:]\s+", re.IGNORECASE)
+
+
+class SchemaValidationError(ValueError):
+    """Raised when an agent response cannot be repaired into a valid shape."""
+
+
+# --- Normalizers ---
+def _require_text(data: dict, key: str) -> str:
+    value = data.get(key)
+    if isinstance(value, list):
+        value = "\n".join(str(v) for v in value)
+    if not isinstance(value, str) or not value.strip():
+        raise SchemaValidationError(f"missing or empty '{key}'")
+    return value.strip()
+
+def normalize_sub_concepts(data: dict) -> dict:
+    """De-duplicates `sub_concepts` and drops empty entries."""
+    sub_concepts = data.get("sub_concepts")
+    if isinstance(sub_concepts, str):
+        sub_concepts = sub_concepts.splitlines()
+    if not isinstance(sub_concepts, list):
+        raise SchemaValidationError("'sub_concepts' is not a list")
+
+    cleaned = []
+    for item in sub_concepts:
+        text = str(item).strip(" -*\t") if item is not None else ""
+        if text and text not in cleaned:
+            cleaned.append(text)
+    if not cleaned:
+        raise SchemaValidationError("'sub_concepts' is empty")
+    return {**data, "sub_concepts": cleaned}
+
+def _normalize_answer_letter(item, options: list) -> str:
+    text = str(item).strip()
+    match = _LETTER_RE.match(text)
+    if match:
+        return match.group(1).upper()
+    # The model sometimes answers with the option text instead of its letter,
+    # possibly with the same "B) " label that was stripped from the options.
+    text = _OPTION_LABEL_RE.sub("", text)
+    for letter, option in zip(OPTION_LETTERS, options):
+        if text.lower() == option.lower():
+            return letter
+    raise SchemaValidationError(f"answer '{text}' does not map to an option")
+
+def normalize_question(data: dict) -> dict:
+    """Repairs trivial issues in a drafted/refined question or raises SchemaValidationError."""
+    question = dict(data)
+    question["question"] = _require_text(data, "question")
+    question["explanation"] = _require_text(data, "explanation")
+
+    options = data.get("options") or []
+    if not isinstance(options, list):
+        raise SchemaValidationError("'options' is not a list")
+    options = [_OPTION_LABEL_RE.sub("", str(opt).strip()) for opt in options]
+
+    answer = data.get("answer")
+    if answer is not None and not isinstance(answer, list):
+        answer = [answer]
+    if not answer or any(str(item).strip() == "" for item in answer):
+        raise SchemaValidationError("missing 'answer'")
+
+    q_type = str(data.get("type", "")).strip().upper()
+    if q_type not in QUESTION_TYPES:
+        # e.g. "FIGURE" or a missing type: infer it from the shape of the answer.
+        if not options:
+            q_type = "NAT"
+        else:
+            q_type = "MCQ" if len(answer) == 1 else "MSQ"
+
+    if q_type == "NAT":
+        if len(answer) != 1:
+            raise SchemaValidationError("NAT question must have exactly one answer")
+        try:
+            value = float(str(answer[0]).strip())
+        except ValueError:
+            raise SchemaValidationError(f"NAT answer '{answer[0]}' is not numeric")
+        if not math.isfinite(value):
+            raise SchemaValidationError(f"NAT answer '{answer[0]}' is not a finite number")
+        options = []
+        answer = [str(answer[0]).strip()]
+    else:
+        if len(options) != len(OPTION_LETTERS):
+            raise SchemaValidationError(f"{q_type} question has {len(options)} options, expected {len(OPTION_LETTERS)}")
+        answer = sorted({_normalize_answer_letter(item, options) for item in answer})
+        if q_type == "MCQ" and len(answer) != 1:
+            # More than one correct letter means the question is really an MSQ.
+            q_type = "MSQ"
+
+    question["type"] = q_type
+    question["options"] = options
+    question["answer"] = answer
+    return question
+
+def normalize_critique(data: dict) -> dict:
+    """Coerces `is_exam_ready` to a boolean and `critique` to a string."""
+    ready = data.get("is_exam_ready")
+    if isinstance(ready, str):
+        if ready.strip().lower() not in ("true", "false"):
+            raise SchemaValidationError(f"'is_exam_ready' is not a boolean: {ready}")
+        ready = ready.strip().lower() == "true"
+    if not isinstance(ready, bool):
+        raise SchemaValidationError("missing 'is_exam_ready'")
+
+    critique = data.get("critique", "")
+    if isinstance(critique, list):
+        critique = "\n".join(str(c) for c in critique)
+    return {**data, "is_exam_ready": ready, "critique": str(critique).strip()}
+
+
+# --- Validation Statistics ---
+_stats_lock = threading.Lock()
+_validation_stats: dict[str, dict[str, int]] = {}
+
+def _record(agent_name: str, outcome: str):
+    with _stats_lock:
+        stats = _validation_stats.setdefault(agent_name, {"calls": 0, "valid": 0, "repaired": 0, "failed": 0})
+        stats["calls"] += 1
+        stats[outcome] += 1
+
+def validate_response(agent_name: str, response: dict | None, normalizer):
+    """
+    Runs an agent's normalizer over a raw LLM response and records the outcome.
+    Returns the normalized value, or None if the response is unusable.
+    """
+    if not isinstance(response, dict):
+        # None (the call failed) or a JSON value that isn't an object.
+        if response is not None:
+            print(f"  - Schema validation failed for {agent_name}: expected a JSON object, got {type(response).__name__}")
+        _record(agent_name, "failed")
+        return None
+    try:
+        normalized = normalizer(response)
+    except SchemaValidationError as e:
+        print(f"  - Schema validation failed for {agent_name}: {e}")
+        _record(agent_name, "failed")
+        return None
+    _record(agent_name, "valid" if normalized == response else "repaired")
+    return normalized
+
+def get_validation_stats() -> dict[str, dict]:
+    """Returns per-agent validation counts and the failure rate for each agent."""
+    with _stats_lock:
+        snapshot = {name: dict(stats) for name, stats in _validation_stats.items()}
+    for stats in snapshot.values():
+        stats["failure_rate"] = stats["failed"] / stats["calls"] if stats["calls"] else 0.0
+    return snapshot
+
+def log_validation_stats():
+    """Prints a one-line summary of the per-agent validation outcomes so far."""
+    stats = get_validation_stats()
+    if not stats:
+        return
+    summary = " | ".join(
+        f"{name}: {s['failed']}/{s['calls']} failed ({s['failure_rate']:.0%}), {s['repaired']} repaired"
+        for name, s in sorted(stats.items())
+    )
+    print(f"🧾 Schema validation: {summary}")
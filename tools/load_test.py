@@ -0,0 +1,395 @@
+# tools/load_test.py
+"""
+Headless load generator for the Streamlit app.
+
+Simulates N concurrent exam takers, each running through generate -> take ->
+submit -> history -> search. Every simulated action calls the same data paths
+app.py calls, plus the work each Streamlit rerun repeats (`get_test_history`
+and the topic saturation lookup). The LLM and web search are replaced by stubs
+with a configurable latency. The SQLite database, ChromaDB collection and
+embedding model are the real ones, created in a scratch directory so the real
+question bank is untouched.
+
+Streamlit's AppTest can't drive the sessions itself: each run resets the global
+Runtime singleton and recompiles the script, so concurrent AppTest sessions
+break each other.
+
+Usage:
+    python -m tools.load_test --sessions 20 --questions 5 --llm-latency 0.2
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SEARCH_KEYWORDS = ["deadlock", "cache", "graph", "parsing", "normalization", "pipelining", "recursion", "hashing"]
+
+# --- Metrics ---
+class Metrics:
+    """Thread-safe collection of latency samples and counters."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: dict[str, list[float]] = {}
+        self.counters: dict[str, int] = {}
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def timed(self, name: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "latency_s": {name: _percentiles(values) for name, values in sorted(self.samples.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+def _percentiles(values: list[float]) -> dict:
+    ordered = sorted(values)
+    def pick(p):
+        # Nearest-rank percentile.
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+    return {"n": len(ordered), "p50": pick(50), "p90": pick(90), "p99": pick(99), "max": ordered[-1]}
+
+class InstrumentedLock:
+    """A drop-in threading.Lock that records how long each acquire waited."""
+    def __init__(self, name: str, metrics: Metrics):
+        self._lock = threading.Lock()
+        self._name = name
+        self._metrics = metrics
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self._metrics.record(f"lock_wait:{self._name}", time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+def _instrument_sqlite(metrics: Metrics):
+    """
+    Patches sqlite3.connect so every statement and commit is timed. Writes and
+    commits wait on SQLite's database lock, so their latency shows write
+    contention; "database is locked" errors are counted separately.
+    """
+    def timed_call(name, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                metrics.increment("sqlite_locked_errors")
+            raise
+        finally:
+            metrics.record(name, time.perf_counter() - start)
+
+    class TimedCursor(sqlite3.Cursor):
+        def execute(self, sql, parameters=()):
+            is_write = not sql.lstrip().upper().startswith(("SELECT", "PRAGMA"))
+            return timed_call("sqlite_write" if is_write else "sqlite_read", super().execute, sql, parameters)
+
+    class TimedConnection(sqlite3.Connection):
+        def cursor(self, factory=TimedCursor):
+            return super().cursor(factory)
+
+        def execute(self, sql, parameters=()):
+            return self.cursor().execute(sql, parameters)
+
+        def commit(self):
+            return timed_call("sqlite_commit", super().commit)
+
+        def __exit__(self, exc_type, exc, tb):
+            # sqlite3's own __exit__ commits in C without going through commit(),
+            # so `with conn:` blocks are timed here.
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+            return False
+
+    original_connect = sqlite3.connect
+    def connect(*args, **kwargs):
+        kwargs.setdefault("factory", TimedConnection)
+        return original_connect(*args, **kwargs)
+    sqlite3.connect = connect
+
+def _timed_wrapper(metrics: Metrics, name: str, func):
+    def wrapper(*args, **kwargs):
+        return metrics.timed(name, func, *args, **kwargs)
+    return wrapper
+
+def _rss_mb() -> float | None:
+    """Current resident set size of this process, if the platform exposes it."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak, in kB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return None
+
+def _deep_sizeof(obj, seen: set | None = None) -> int:
+    """Approximate memory held by a session-state value and everything it references."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+# --- LLM Stubs ---
+def _install_stubs(latency_s: float):
+    """Replaces the Ollama and web-search calls with canned, schema-valid responses."""
+    import core.agents
+    import core.llm_client
+    import core.orchestrator
+
+    def fake_generate_json_response(system_prompt, user_prompt, schema=None, label="chat", token=None):
+        if token:
+            token.raise_if_cancelled(label)
+        time.sleep(latency_s)
+        if label == "topic_analysis_agent":
+            return {"sub_concepts": [f"Sub-concept {i}" for i in range(1, 7)]}
+        if label == "critique_agent":
+            return {"is_exam_ready": random.random() < 0.5, "critique": "Tighten the distractors."}
+        # Unique text so the dedup check doesn't reject stub questions.
+        return {
+            "question": f"{random.choice(SEARCH_KEYWORDS).title()} question {uuid.uuid4()}?",
+            "type": "MCQ",
+            "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
+            "answer": [random.choice(["A", "B", "C", "D"])],
+            "explanation": "Stub explanation.",
+        }
+
+    def fake_research_agent(sub_concept, token=None):
+        if token:
+            token.raise_if_cancelled("research_agent")
+        time.sleep(latency_s)
+        return f"Stub research context for {sub_concept}."
+
+    core.agents.generate_json_response = fake_generate_json_response
+    core.orchestrator.research_agent = fake_research_agent
+    core.orchestrator.warm_up_model = lambda token=None: True
+
+    def fake_check_and_pull_model():
+        # Stands in for the ollama.list() round trip every new session makes.
+        time.sleep(latency_s)
+    core.llm_client.check_and_pull_model = fake_check_and_pull_model
+
+# --- Simulated Exam Taker ---
+# Stands in for app.py's st.cache_resource: the first session runs the
+# process-wide setup while concurrent sessions wait for it to finish.
+_process_init_lock = threading.Lock()
+_process_initialized = False
+
+def _initialize_session():
+    """The work app.py's initialize_session_state does when a session first loads."""
+    global _process_initialized
+    import core.llm_client
+    from components.analytics import initialize_db
+    from components.coverage import backfill_coverage
+
+    with _process_init_lock:
+        if not _process_initialized:
+            initialize_db()
+            backfill_coverage()
+            _process_initialized = True
+    core.llm_client.check_and_pull_model()
+
+def _pick_answer(question: dict):
+    """Answers a question the way app.py's widgets record it: option text, or a number for NAT."""
+    options = question.get("options", [])
+    if question["type"] == "MCQ":
+        return random.choice(options)
+    if question["type"] == "MSQ":
+        return random.sample(options, random.randint(0, len(options)))
+    return round(random.uniform(0, 100), 2)
+
+def _rerun(session: dict):
+    """The data-path work app.py repeats on every Streamlit rerun."""
+    from components.analytics import get_test_history
+    from components.coverage import get_topic_saturation
+
+    if not session.get("test_in_progress"):
+        # The practice tab, and its saturation caption, only render when no test is in progress.
+        get_topic_saturation(session["topic"])
+    get_test_history()
+
+def run_session(session_id: int, args, metrics: Metrics, state_sizes: list[int]):
+    """Drives one session through generate, take, submit, history and search."""
+    from config.syllabus import GATE_CSE_SYLLABUS
+    from core.orchestrator import generate_test_concurrently
+    from components.analytics import save_test_result
+    from components.scoring import is_answer_correct
+    from components.vector_store import search_questions
+
+    subject = random.choice(list(GATE_CSE_SYLLABUS))
+    session = {"topic": random.choice(GATE_CSE_SYLLABUS[subject]), "user_answers": {}}
+    try:
+        def load():
+            _initialize_session()
+            _rerun(session)
+        metrics.timed("action:load", load)
+
+        def generate():
+            session["questions"] = [q for q in generate_test_concurrently(session["topic"], args.questions) if q]
+            session["test_in_progress"] = bool(session["questions"])
+            _rerun(session)
+        metrics.timed("action:generate", generate)
+        if not session["test_in_progress"]:
+            metrics.increment("sessions_without_questions")
+            return
+
+        for i, question in enumerate(session["questions"]):
+            time.sleep(random.uniform(0, args.think_time))
+            session["user_answers"][i] = _pick_answer(question)
+            metrics.timed("action:answer", _rerun, session)
+
+        def submit():
+            score = sum(is_answer_correct(q, session["user_answers"].get(i)) for i, q in enumerate(session["questions"]))
+            metrics.increment("answers_correct", score)
+            metrics.increment("answers_total", len(session["questions"]))
+            save_test_result(session["topic"], score, len(session["questions"]))
+            session["test_in_progress"] = False
+            _rerun(session)
+        metrics.timed("action:submit", submit)
+
+        metrics.timed("action:history", _rerun, session)
+
+        def search():
+            session["search_results"] = search_questions(random.choice(SEARCH_KEYWORDS))
+            _rerun(session)
+        metrics.timed("action:search", search)
+
+        metrics.increment("sessions_completed")
+    except Exception as e:
+        metrics.increment("sessions_failed")
+        print(f"Session {session_id} failed: {e}")
+    finally:
+        state_sizes.append(_deep_sizeof(session))
+
+# --- Entry Point ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent exam takers against the Streamlit app.")
+    parser.add_argument("--sessions", type=int, default=10, help="Number of concurrent exam takers.")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per practice test.")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="Seconds each stubbed LLM or search call takes.")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Maximum seconds a student waits before answering.")
+    parser.add_argument("--workdir", help="Directory for the scratch databases (default: a temporary directory).")
+    parser.add_argument("--keep-workdir", action="store_true", help="Don't delete the scratch databases afterwards.")
+    parser.add_argument("--json", help="Also write the report to this file.")
+    args = parser.parse_args(argv)
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="testcrew-load-"))
+    (workdir / "db").mkdir(parents=True, exist_ok=True)
+    # The app and its components use paths relative to the working directory.
+    os.chdir(workdir)
+    sys.path.insert(0, str(REPO_ROOT))
+
+    metrics = Metrics()
+    # Must run before the components are imported, so the Chroma client is instrumented too.
+    _instrument_sqlite(metrics)
+
+    import components.analytics
+    import components.coverage
+    import components.vector_store
+    from core.schemas import get_validation_stats
+    _install_stubs(args.llm_latency)
+    components.coverage._coverage_lock = InstrumentedLock("coverage_index", metrics)
+    components.analytics.save_test_result = _timed_wrapper(metrics, "data:save_test_result", components.analytics.save_test_result)
+    components.analytics.get_test_history = _timed_wrapper(metrics, "data:get_test_history", components.analytics.get_test_history)
+    components.vector_store.search_questions = _timed_wrapper(metrics, "data:search_questions", components.vector_store.search_questions)
+
+    rss_before = _rss_mb()
+    state_sizes: list[int] = []
+    threads = [
+        threading.Thread(target=run_session, args=(i, args, metrics, state_sizes), name=f"session-{i}")
+        for i in range(args.sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    rss_after = _rss_mb()
+
+    report = {
+        "sessions": args.sessions,
+        "questions_per_test": args.questions,
+        "llm_latency_s": args.llm_latency,
+        "wall_time_s": elapsed,
+        **metrics.summary(),
+        "schema_validation": get_validation_stats(),
+        "memory": {
+            "rss_before_mb": rss_before,
+            "rss_after_mb": rss_after,
+            "rss_growth_per_session_mb": (rss_after - rss_before) / args.sessions if rss_before and rss_after else None,
+            "session_state_bytes": _percentiles(state_sizes) if state_sizes else None,
+        },
+    }
+    _print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if not args.keep_workdir and not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+def _print_report(report: dict):
+    print(f"\n📈 {report['sessions']} sessions x {report['questions_per_test']} questions in {report['wall_time_s']:.1f}s")
+    print(f"{'metric':<32}{'n':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in report["latency_s"].items():
+        print(
+            f"{name:<32}{stats['n']:>7}{stats['p50'] * 1000:>10.1f}{stats['p90'] * 1000:>10.1f}"
+            f"{stats['p99'] * 1000:>10.1f}{stats['max'] * 1000:>10.1f}"
+        )
+    for name, count in report["counters"].items():
+        print(f"{name}: {count}")
+    for name, stats in report["schema_validation"].items():
+        print(f"schema {name}: {stats['failed']}/{stats['calls']} failed ({stats['failure_rate']:.0%}), {stats['repaired']} repaired")
+    memory = report["memory"]
+    if memory["rss_growth_per_session_mb"] is not None:
+        print(f"RSS {memory['rss_before_mb']:.0f} MB -> {memory['rss_after_mb']:.0f} MB ({memory['rss_growth_per_session_mb']:.1f} MB per session)")
+    if memory["session_state_bytes"]:
+        print(f"Session state p50 {memory['session_state_bytes']['p50'] / 1024:.1f} KiB, max {memory['session_state_bytes']['max'] / 1024:.1f} KiB")
+
+if __name__ == "__main__":
+    main()